@@ -2,38 +2,67 @@
 """
 GitHub Social Preview Image Generator
 Creates a 1280x640px image for doubao-earphone-to-obsidian repository
+
+Requires numpy and pillow, which are not part of requirements.txt:
+    pip install "numpy>=1.24.0" "pillow>=10.0.0"
 """
 
+from functools import lru_cache
+
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import os
 
-def create_social_preview():
-    # Image dimensions (GitHub recommended: 1280x640)
-    width, height = 1280, 640
+# Image dimensions (GitHub recommended: 1280x640)
+WIDTH, HEIGHT = 1280, 640
 
-    # Create image with gradient background
-    img = Image.new('RGB', (width, height), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
+FONT_PATH = "/System/Library/Fonts/Helvetica.ttc"
+FONT_SIZES = {"title": 72, "subtitle": 36, "desc": 28}
+
+# 1x1 canvas used only for text measurement
+_probe_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+def build_gradient_lut(height):
+    """Precompute the per-row RGB gradient (dark blue -> purple) as a (height, 3) uint8 table"""
+    rows = np.arange(height)
+    lut = np.empty((height, 3), np.uint8)
+    lut[:, 0] = 26 + rows * 30 // height  # 26 -> 56
+    lut[:, 1] = 26 + rows * 20 // height  # 26 -> 46
+    lut[:, 2] = 46 + rows * 40 // height  # 46 -> 86
+    return lut
+
+
+GRADIENT_LUT = build_gradient_lut(HEIGHT)
 
-    # Create gradient background
-    for y in range(height):
-        # Gradient from dark blue to purple
-        r = int(26 + (y / height) * 30)  # 26 -> 56
-        g = int(26 + (y / height) * 20)  # 26 -> 46
-        b = int(46 + (y / height) * 40)  # 46 -> 86
-        color = (r, g, b)
-        draw.line([(0, y), (width, y)], fill=color)
 
-    # Try to load fonts, fallback to default if not available
+@lru_cache(maxsize=None)
+def load_font(font_key):
+    """Load a font once per key, falling back to the default font"""
     try:
-        title_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 72)
-        subtitle_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 36)
-        desc_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 28)
-    except:
-        # Fallback fonts
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-        desc_font = ImageFont.load_default()
+        return ImageFont.truetype(FONT_PATH, FONT_SIZES[font_key])
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=64)
+def measure(text, font_key):
+    """Return the cached textbbox of text rendered with the given font"""
+    return _probe_draw.textbbox((0, 0), text, font=load_font(font_key))
+
+
+def create_social_preview():
+    width, height = WIDTH, HEIGHT
+
+    # Create gradient background by broadcasting the precomputed row LUT
+    arr = np.broadcast_to(GRADIENT_LUT[:, None, :], (height, width, 3)).copy()
+    img = Image.fromarray(arr, 'RGB')
+    draw = ImageDraw.Draw(img)
+
+    # Fonts are loaded once and cached, fallback to default if not available
+    title_font = load_font("title")
+    subtitle_font = load_font("subtitle")
+    desc_font = load_font("desc")
 
     # Colors
     white = '#FFFFFF'
@@ -42,14 +71,14 @@ def create_social_preview():
 
     # Main title
     title = "🎙️ Doubao Earphone Assistant"
-    title_bbox = draw.textbbox((0, 0), title, font=title_font)
+    title_bbox = measure(title, "title")
     title_width = title_bbox[2] - title_bbox[0]
     title_x = (width - title_width) // 2
     draw.text((title_x, 80), title, fill=white, font=title_font)
 
     # Subtitle
     subtitle = "Real-time Voice Assistant for AI Earphones & Obsidian"
-    subtitle_bbox = draw.textbbox((0, 0), subtitle, font=subtitle_font)
+    subtitle_bbox = measure(subtitle, "subtitle")
     subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
     subtitle_x = (width - subtitle_width) // 2
     draw.text((subtitle_x, 180), subtitle, fill=accent, font=subtitle_font)
@@ -110,14 +139,14 @@ def create_social_preview():
     feature_width = width // len(features)
     for i, feature in enumerate(features):
         feature_x = i * feature_width + feature_width // 2
-        feature_bbox = draw.textbbox((0, 0), feature, font=desc_font)
+        feature_bbox = measure(feature, "desc")
         feature_text_width = feature_bbox[2] - feature_bbox[0]
         draw.text((feature_x - feature_text_width // 2, features_y),
                  feature, fill=white, font=desc_font)
 
     # GitHub info at bottom
     github_text = "github.com/GptsApp/doubao-earphone-to-obsidian"
-    github_bbox = draw.textbbox((0, 0), github_text, font=desc_font)
+    github_bbox = measure(github_text, "desc")
     github_width = github_bbox[2] - github_bbox[0]
     github_x = (width - github_width) // 2
     draw.text((github_x, 570), github_text, fill=accent, font=desc_font)
@@ -12,25 +12,36 @@ import hashlib
 import json
 import logging
 import os
+import random
 import re
 import sqlite3
 import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import aiofiles
+import orjson
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+from playwright.async_api import Error as PlaywrightError
 from pydantic import ConfigDict, Field, field_validator
 from pydantic_settings import BaseSettings
 
-# 菜单栏图标和系统通知
-import pystray
-from PIL import Image, ImageDraw
+# 系统通知；菜单栏图标目前已禁用，pystray 与 PIL 在用到时才导入
 from plyer import notification
 
+if TYPE_CHECKING:
+    from PIL import Image
+
+# 更快的事件循环（libuv），Windows 或未安装时回退到标准 asyncio
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # ========== 日志配置 ==========
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -93,8 +104,9 @@ def should_log_debug(key: str, interval_seconds: int = 30) -> bool:
     if not DEBUG:
         return False
 
-    current_time = time.time()
-    last_time = _log_last_time.get(key, 0)
+    # 单调时钟：系统时间调整不会让日志长时间静默或突然刷屏
+    current_time = time.monotonic()
+    last_time = _log_last_time.get(key, float("-inf"))
 
     if current_time - last_time >= interval_seconds:
         _log_last_time[key] = current_time
@@ -109,84 +121,104 @@ def should_log_debug(key: str, interval_seconds: int = 30) -> bool:
         return False
 
 # ========== 正则预编译 ==========
+# 语音识别可能的变体
+NOTE_VARIANTS = (
+    KEYWORD_NOTE,      # 记笔记
+    "笔记",            # 记字丢失
+    "几笔记", "及笔记", "即笔记", "寄笔记",  # 同音字/近音字
+    "记个笔记", "记一下笔记", "记录笔记", "记1个笔记", "记一个笔记",  # 口语化+数字
+    "帮我记笔记", "帮我记个笔记", "帮我记一下笔记",  # 更口语化
+    "记记笔记", "笔笔记",  # 重复字符
+    "记比记",  # 方言变体
+)
+
+TASK_VARIANTS = (
+    KEYWORD_TASK,      # 记任务
+    "任务",            # 记字丢失
+    "几任务", "及任务", "即任务", "寄任务",  # 同音字/近音字
+    "记个任务", "记一下任务", "记录任务", "记1个任务", "记一个任务",  # 口语化+数字
+    "添加任务", "新增任务", "创建任务",  # 同义词
+    "帮我记任务", "帮我记个任务", "帮我添加任务", "帮我记一下任务",  # 更口语化
+    "记记任务", "任任务",  # 重复字符
+    "人务", "认务", "仁务",  # 方言/近音变体
+)
+
+# 更宽松的分隔符匹配，包括语气词和填充词
+# 支持：嗯、那个、OK等常见语气词
+FILLER_WORDS = r"(?:嗯[，,\s]*|那个[，,\s]*|OK[，,\s]*|好的[，,\s]*|呃[，,\s]*)?"
+
+
 def build_cmd_regex() -> re.Pattern[str]:
     """根据配置的关键词构建触发正则，容忍"豆包豆包"前缀和语音识别问题"""
-    # 基础关键词
-    kw_note = re.escape(KEYWORD_NOTE)
-    kw_task = re.escape(KEYWORD_TASK)
-
-    # 语音识别可能的变体
-    note_variants = [
-        kw_note,           # 记笔记
-        "笔记",            # 记字丢失
-        "几笔记", "及笔记", "即笔记", "寄笔记",  # 同音字/近音字
-        "记个笔记", "记一下笔记", "记录笔记", "记1个笔记", "记一个笔记",  # 口语化+数字
-        "帮我记笔记", "帮我记个笔记", "帮我记一下笔记",  # 更口语化
-        "记记笔记", "笔笔记",  # 重复字符
-        "记比记",  # 方言变体
-    ]
-
-    task_variants = [
-        kw_task,           # 记任务
-        "任务",            # 记字丢失
-        "几任务", "及任务", "即任务", "寄任务",  # 同音字/近音字
-        "记个任务", "记一下任务", "记录任务", "记1个任务", "记一个任务",  # 口语化+数字
-        "添加任务", "新增任务", "创建任务",  # 同义词
-        "帮我记任务", "帮我记个任务", "帮我添加任务", "帮我记一下任务",  # 更口语化
-        "记记任务", "任任务",  # 重复字符
-        "人务", "认务", "仁务",  # 方言/近音变体
-    ]
-
     # 构建正则模式
-    note_pattern = "|".join(re.escape(v) for v in note_variants)
-    task_pattern = "|".join(re.escape(v) for v in task_variants)
+    note_pattern = "|".join(re.escape(v) for v in NOTE_VARIANTS)
+    task_pattern = "|".join(re.escape(v) for v in TASK_VARIANTS)
+
+    return re.compile(rf"^\s*{FILLER_WORDS}(?:豆包豆包[，,:：。\s]*)?{FILLER_WORDS}(?:帮我\s*)?({note_pattern}|{task_pattern})(?:[，,:：。\s吧呢啊]*)?(.+)$", re.IGNORECASE)
+
+
+def build_keyword_only_regex() -> re.Pattern[str]:
+    """构建"只包含关键词"消息的正则（可能带豆包豆包前缀和语气词，但没有内容）"""
+    variants_pattern = "|".join(re.escape(v) for v in NOTE_VARIANTS + TASK_VARIANTS)
+    return re.compile(rf"^\s*{FILLER_WORDS}(?:豆包豆包[，,:：。\s]*)?{FILLER_WORDS}(?:帮我\s*)?({variants_pattern})(?:[，,:：。\s吧呢啊]*)?$", re.IGNORECASE)
 
-    # 更宽松的分隔符匹配，包括语气词和填充词
-    # 支持：嗯、那个、OK等常见语气词
-    filler_words = r"(?:嗯[，,\s]*|那个[，,\s]*|OK[，,\s]*|好的[，,\s]*|呃[，,\s]*)?"
 
-    return re.compile(rf"^\s*{filler_words}(?:豆包豆包[，,:：。\s]*)?{filler_words}(?:帮我\s*)?({note_pattern}|{task_pattern})(?:[，,:：。\s吧呢啊]*)?(.+)$", re.IGNORECASE)
+def build_cmd_needles() -> tuple[str, ...]:
+    """取能覆盖所有关键词变体的最短子串集合，用于在正则匹配前做廉价的 in 预筛"""
+    needles: list[str] = []
+    for variant in sorted({v.lower() for v in NOTE_VARIANTS + TASK_VARIANTS}, key=len):
+        if not any(needle in variant for needle in needles):
+            needles.append(variant)
+    return tuple(needles)
+
+
+def build_cmd_prefixes() -> tuple[str, ...]:
+    """命令行可能的全部开头（语气词、豆包豆包、帮我、关键词变体），供 str.startswith 一次性比较"""
+    prefixes = {"嗯", "那个", "OK", "Ok", "oK", "ok", "好的", "呃", "豆包豆包", "帮我"}
+    prefixes.update(v.lower() for v in NOTE_VARIANTS + TASK_VARIANTS)
+    return tuple(sorted(prefixes))
+
 
 CMD_RE = build_cmd_regex()
+KEYWORD_ONLY_RE = build_keyword_only_regex()
+CMD_NEEDLES = build_cmd_needles()
+CMD_PREFIXES = build_cmd_prefixes()
+# 关键词含大小写字母时（自定义英文关键词），预筛需与 CMD_RE 一样忽略大小写
+CMD_NEEDLES_CASED = any(needle != needle.upper() for needle in CMD_NEEDLES)
+
+# 传统模式下去除内容开头重复的"豆包豆包/关键词"前缀
+PREFIX_RE = re.compile(
+    rf"^(?:豆包豆包[，,:：。\s]*)?(?:{re.escape(KEYWORD_NOTE)}|{re.escape(KEYWORD_TASK)})[：:，,。\s]+"
+)
+
+# 变体 -> 基础关键词；笔记变体后合并，与原先"先判断笔记"的优先级一致
+VARIANT_TO_KEYWORD: dict[str, str] = (
+    {v.lower(): KEYWORD_TASK for v in TASK_VARIANTS}
+    | {v.lower(): KEYWORD_NOTE for v in NOTE_VARIANTS}
+)
+
 
 def normalize_matched_keyword(matched_keyword: str) -> str:
     """将匹配到的关键词变体标准化为基础关键词"""
-    matched_lower = matched_keyword.lower().strip()
-
-    # 笔记相关的所有变体
-    note_variants = [
-        KEYWORD_NOTE.lower(), "笔记", "几笔记", "及笔记", "即笔记", "寄笔记",
-        "记个笔记", "记一下笔记", "记录笔记", "记1个笔记", "记一个笔记",
-        "帮我记笔记", "帮我记个笔记", "帮我记一下笔记",
-        "记记笔记", "笔笔记", "记比记"
-    ]
-
-    # 任务相关的所有变体
-    task_variants = [
-        KEYWORD_TASK.lower(), "任务", "几任务", "及任务", "即任务", "寄任务",
-        "记个任务", "记一下任务", "记录任务", "记1个任务", "记一个任务",
-        "添加任务", "新增任务", "创建任务",
-        "帮我记任务", "帮我记个任务", "帮我添加任务", "帮我记一下任务",
-        "记记任务", "任任务", "人务", "认务", "仁务"
-    ]
-
-    if matched_lower in note_variants:
-        return KEYWORD_NOTE
-    elif matched_lower in task_variants:
-        return KEYWORD_TASK
-    else:
-        # 如果没有匹配到，返回原始值（不应该发生，但作为后备）
-        return matched_keyword
+    # 如果没有匹配到，返回原始值（不应该发生，但作为后备）
+    return VARIANT_TO_KEYWORD.get(matched_keyword.lower().strip(), matched_keyword)
 
 # 预编译归一化正则
-NORMALIZE_NOTE_RE = re.compile(
-    rf"^(豆包豆包[，,:：\s]*)?{re.escape(KEYWORD_NOTE)}[，,:：\s]*{re.escape(KEYWORD_NOTE)}[，,:：\s]*"
-)
-NORMALIZE_TASK_RE = re.compile(
-    rf"^(豆包豆包[，,:：\s]*)?{re.escape(KEYWORD_TASK)}[，,:：\s]*{re.escape(KEYWORD_TASK)}[，,:：\s]*"
+# 重复的关键词前缀（"记笔记 记笔记 …"）合并为一个，笔记/任务共用一次扫描
+NORMALIZE_PREFIX_RE = re.compile(
+    rf"^(?:豆包豆包[，,:：\s]*)?(?P<kw>{re.escape(KEYWORD_NOTE)}|{re.escape(KEYWORD_TASK)})[，,:：\s]*(?P=kw)[，,:：\s]*"
 )
-NORMALIZE_SPACE_RE = re.compile(r"[ \t]+")
+# 只替换连续空白和制表符，单个空格本身无需改写
+NORMALIZE_SPACE_RE = re.compile(r"[ \t]{2,}|\t")
 NORMALIZE_REMOVE_RE = re.compile(r"[分享\s。．·!！?？、,.，:：;；\-]+")
+# 需从末尾剥离的标点（与空白交替出现时一并剥离）
+NORMALIZE_TRAIL_PUNCT = "。，！？、；："
+
+# 两个基础关键词合并为一个正则：长文本上一次扫描比两次子串查找更快，也便于扩展更多关键词
+KEYWORD_RE = re.compile(f"{re.escape(KEYWORD_NOTE)}|{re.escape(KEYWORD_TASK)}")
+
+# .env 中的 OBSIDIAN_VAULT 配置行
+_ENV_VAULT_RE = re.compile(r"^OBSIDIAN_VAULT\s*=.*$", re.MULTILINE)
 
 # ========== 上下文状态管理 ==========
 class PendingCommand:
@@ -248,10 +280,15 @@ class DailyStats:
         """增加跳过重复消息计数"""
         self.duplicate_skipped += 1
 
+    @property
+    def total(self) -> int:
+        """今日记录总数（笔记 + 任务）"""
+        return self.notes_count + self.tasks_count
+
     def get_summary(self) -> str:
         """获取统计摘要"""
         self.reset_if_new_day()
-        total = self.notes_count + self.tasks_count
+        total = self.total
         uptime = time.time() - self.start_time
         uptime_str = f"{int(uptime//3600)}h{int((uptime%3600)//60)}m"
         return f"今日记录: {total} 条 (笔记{self.notes_count}, 任务{self.tasks_count})\n运行时间: {uptime_str}, 处理: {self.processed_messages}, 跳过: {self.duplicate_skipped}"
@@ -273,55 +310,87 @@ def hhmm(timestamp: int | None = None) -> str:
 
 
 # ========== 文本归一化 & 去重 ==========
-# 内存缓存：最近处理过的内容哈希
-_recent_hashes = set()
+# 内存缓存：最近处理过的内容哈希（LRU，最久未出现的先淘汰）
+_recent_hashes: OrderedDict[bytes, None] = OrderedDict()
 _max_cache_size = 1000
 
-def normalize_text(text: str) -> str:
-    """清洗文本：去"分享"、合并重复前缀、统一分隔符、压缩空白"""
+def normalize_block(text: str) -> str:
+    """清洗文本：去"分享"、合并重复前缀、统一分隔符、压缩空白（不缓存，用于整块候选文本）"""
     result = (text or "").replace("\u200b", "").replace("分享", "")
 
-    result = NORMALIZE_NOTE_RE.sub(f"{KEYWORD_NOTE} ", result)
-    result = NORMALIZE_TASK_RE.sub(f"{KEYWORD_TASK} ", result)
-    result = NORMALIZE_SPACE_RE.sub(" ", result)
+    result = NORMALIZE_PREFIX_RE.sub(r"\g<kw> ", result, count=1)
+    # 整页文本（brute_scrape 最多 50KB）通常没有连续空白：先做 C 级子串查找，必要时才走正则
+    if "  " in result or "\t" in result:
+        result = NORMALIZE_SPACE_RE.sub(" ", result)
 
-    # 清理末尾的标点符号（句号、逗号、感叹号、问号等）
+    # 清理末尾的标点符号（句号、逗号、感叹号、问号等）及夹杂的空白
+    # 从尾部逐字符回退，耗时与剥离长度成线性；"[...]+$" 正则在中间的长空白段上会退化为平方级
     result = result.strip()
-    while result and result[-1] in "。，！？、；：":
-        result = result[:-1].strip()
+    end = len(result)
+    while end and (result[end - 1] in NORMALIZE_TRAIL_PUNCT or result[end - 1].isspace()):
+        end -= 1
+    return result[:end]
+
 
-    return result
+# 同一行在轮询、网络、DOM 多个通道中反复出现，缓存单行的归一化与哈希结果；
+# 整块候选文本（最长可达数十 KB）几乎不会重复，只走 normalize_block，避免缓存长期占用内存
+@lru_cache(maxsize=2048)
+def normalize_text(text: str) -> str:
+    """清洗单行文本，结果缓存"""
+    return normalize_block(text)
 
 
-def compute_dedup_hash(text: str) -> str:
+@lru_cache(maxsize=2048)
+def compute_dedup_hash(text: str) -> bytes:
     """对去噪内容做哈希，用于去重"""
     base = normalize_text(text)
     base = NORMALIZE_REMOVE_RE.sub("", base)
+    # 去重无需密码学强度，BLAKE2b-128 比 SHA-256 更快；直接用 16 字节原始摘要作主键，比十六进制文本小一半
+    return hashlib.blake2b(base.encode(), digest_size=16).digest()
+
+
+def compute_legacy_dedup_hash(text: str) -> str:
+    """旧版本的去重 key（SHA-256 十六进制），升级后一个去重窗口内用于比对库中的旧记录"""
+    base = NORMALIZE_REMOVE_RE.sub("", normalize_text(text))
     return hashlib.sha256(base.encode()).hexdigest()
 
 
+# 各通道（Observer/DOM/Network/Brute）最近收到的原始文本摘要（LRU）：
+# 同一条消息常由多个通道先后送达，第二份起在任何正则或数据库操作之前直接跳过
+_raw_text_hashes: OrderedDict[bytes, None] = OrderedDict()
+RAW_TEXT_CACHE_SIZE = 1024
+
+
+def is_raw_text_seen(raw_text: str) -> bool:
+    """原始文本最近已由任一通道送达过则返回 True，否则记录其摘要"""
+    digest = hashlib.blake2b(raw_text.encode(), digest_size=8).digest()
+    if digest in _raw_text_hashes:
+        _raw_text_hashes.move_to_end(digest)
+        return True
+    _raw_text_hashes[digest] = None
+    if len(_raw_text_hashes) > RAW_TEXT_CACHE_SIZE:
+        _raw_text_hashes.popitem(last=False)
+    return False
+
+
 def is_recently_processed(text: str) -> bool:
     """检查是否最近已处理过（内存缓存），优化去重策略"""
-    global _recent_hashes
-
     # 对于关键词消息，使用更宽松的去重策略
     if KEYWORD_NOTE in text or KEYWORD_TASK in text:
-        # 只对完全相同的内容进行去重，避免误判
-        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        # 只对完全相同的内容进行去重，避免误判（16 字节原始摘要，省内存）
+        text_hash = hashlib.blake2b(text.encode(), digest_size=16).digest()
     else:
         # 对于非关键词消息，使用原有的归一化去重
         text_hash = compute_dedup_hash(text)
 
     if text_hash in _recent_hashes:
+        _recent_hashes.move_to_end(text_hash)
         return True
 
-    # 添加到缓存
-    _recent_hashes.add(text_hash)
-
-    # 限制缓存大小
+    # 添加到缓存，超出上限时淘汰最久未出现的一条
+    _recent_hashes[text_hash] = None
     if len(_recent_hashes) > _max_cache_size:
-        # 清理一半缓存
-        _recent_hashes = set(list(_recent_hashes)[_max_cache_size//2:])
+        _recent_hashes.popitem(last=False)
 
     return False
 
@@ -329,6 +398,20 @@ def is_recently_processed(text: str) -> bool:
 DB: sqlite3.Connection | None = None
 DB_LOCK = threading.Lock()
 
+# 写回缓冲：去重判断只读写内存，(id, ts) 攒批后由后台任务一次 executemany 写入并提交
+DB_FLUSH_BATCH = 64
+DB_FLUSH_DELAY = 0.5  # 秒，无新批次时最长等待时间
+SEEN_PRUNE_INTERVAL = 3600.0  # 秒，长时间运行时定期清理过期记录
+UPSERT_SEEN_SQL = "INSERT INTO seen(id, ts) VALUES(?, ?) ON CONFLICT(id) DO UPDATE SET ts=excluded.ts"
+_pending_seen: list[tuple[bytes, float]] = []
+_seen_flush_event = asyncio.Event()
+_seen_flusher: asyncio.Task | None = None
+
+# 去重窗口内各 key 最近一次出现的时间戳：以内存为准，数据库只用于重启后恢复
+_seen_ts: dict[bytes, float] = {}
+# 旧版本写入的记录（id 为 SHA-256 十六进制文本）：升级后仍需在一个去重窗口内参与判断，过期后自然清空
+_legacy_seen_ts: dict[str, float] = {}
+
 
 def init_database() -> None:
     """初始化全局数据库连接，使用 WAL 模式"""
@@ -336,46 +419,131 @@ def init_database() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     DB = sqlite3.connect(DB_PATH, check_same_thread=False)
     DB.execute("PRAGMA journal_mode=WAL;")
+    # WAL 下 NORMAL 只在检查点时 fsync，崩溃或断电也不会损坏数据库；写入已按批提交，额外开销很小
     DB.execute("PRAGMA synchronous=NORMAL;")
-    DB.execute("CREATE TABLE IF NOT EXISTS seen(id TEXT PRIMARY KEY, ts REAL)")
+    DB.execute("PRAGMA temp_store=MEMORY;")
+    # 点查询走内存映射与 16 MiB 页缓存，减少 pread 系统调用
+    DB.execute("PRAGMA mmap_size=268435456;")
+    DB.execute("PRAGMA cache_size=-16000;")
+    DB.execute("PRAGMA wal_autocheckpoint=1000;")
+    # id: compute_dedup_hash 生成的 16 字节摘要（旧版本建的表声明为 TEXT，BLOB 值同样按原样存储）
+    DB.execute("CREATE TABLE IF NOT EXISTS seen(id BLOB PRIMARY KEY, ts REAL)")
+    # 按时间清理与启动预加载都是 ts 范围查询
+    DB.execute("CREATE INDEX IF NOT EXISTS idx_seen_ts ON seen(ts)")
     DB.commit()
-    atexit.register(lambda: DB and DB.close())
 
+    cutoff = time.time() - max(1, DEDUP_HOURS) * 3600
+    # 当前版本的 id 是字节摘要；旧版本以 SHA-256 十六进制文本保存，单独加载供 compute_legacy_dedup_hash 比对
+    for key, ts in DB.execute("SELECT id, ts FROM seen WHERE ts >= ?", (cutoff,)):
+        if isinstance(key, bytes):
+            _seen_ts[key] = ts
+        else:
+            _legacy_seen_ts[key] = ts
+    atexit.register(close_database)
 
-def cleanup_old_records(horizon_hours: int = 36) -> None:
-    """清理超过 horizon_hours 的旧记录"""
+
+def close_database() -> None:
+    """写入尚未落盘的记录并关闭数据库连接"""
+    global DB
+    if DB is None:
+        return
+    with DB_LOCK:
+        if _pending_seen:
+            DB.executemany(UPSERT_SEEN_SQL, _pending_seen)
+            _pending_seen.clear()
+        DB.commit()
+        DB.close()
+        DB = None
+
+
+def _write_seen_batch(batch: list[tuple[bytes, float]]) -> None:
+    """在工作线程中执行：一个事务写入一批 (id, ts)"""
+    with DB_LOCK:
+        DB.executemany(UPSERT_SEEN_SQL, batch)
+        DB.commit()
+
+
+async def seen_flusher() -> None:
+    """后台任务：攒满一批或等待 DB_FLUSH_DELAY 后，把待写记录一次写入数据库"""
+    global _pending_seen
+    next_prune = time.monotonic() + SEEN_PRUNE_INTERVAL
+    while True:
+        try:
+            await asyncio.wait_for(_seen_flush_event.wait(), timeout=DB_FLUSH_DELAY)
+        except asyncio.TimeoutError:
+            pass
+        _seen_flush_event.clear()
+
+        # 在事件循环线程中整体换出缓冲区，工作线程只处理自己的那一批
+        batch, _pending_seen = _pending_seen, []
+        if batch:
+            try:
+                await asyncio.to_thread(_write_seen_batch, batch)
+            except sqlite3.Error as e:
+                logger.error(f"写入去重记录失败: {e}")
+
+        # 定期淘汰过期 key：内存部分在事件循环线程中处理，数据库删除放到线程池
+        if time.monotonic() >= next_prune:
+            next_prune = time.monotonic() + SEEN_PRUNE_INTERVAL
+            cutoff = prune_seen_cache(DEDUP_HOURS)
+            try:
+                deleted = await asyncio.to_thread(_delete_old_rows, cutoff)
+            except sqlite3.Error as e:
+                logger.error(f"清理过期记录失败: {e}")
+            else:
+                if DEBUG and deleted > 0:
+                    logger.debug(f"清理了 {deleted} 条过期记录")
+
+
+def prune_seen_cache(horizon_hours: int = 36) -> float:
+    """从内存中移除超过 horizon_hours 的 key，返回使用的截止时间戳"""
     cutoff = time.time() - max(1, horizon_hours) * 3600
+    for key in [key for key, ts in _seen_ts.items() if ts < cutoff]:
+        del _seen_ts[key]
+    for legacy_key in [key for key, ts in _legacy_seen_ts.items() if ts < cutoff]:
+        del _legacy_seen_ts[legacy_key]
+    return cutoff
+
+
+def _delete_old_rows(cutoff: float) -> int:
+    """删除 cutoff 之前的记录并截断 WAL，返回删除条数"""
     with DB_LOCK:
-        cursor = DB.execute("DELETE FROM seen WHERE ts < ?", (cutoff,))
-        deleted = cursor.rowcount
+        deleted = DB.execute("DELETE FROM seen WHERE ts < ?", (cutoff,)).rowcount
         DB.commit()
-        if DEBUG and deleted > 0:
-            logger.debug(f"清理了 {deleted} 条过期记录")
+        # 清理后截断 WAL 文件，避免其长期占用磁盘
+        DB.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    return deleted
+
+
+def cleanup_old_records(horizon_hours: int = 36) -> None:
+    """清理超过 horizon_hours 的旧记录"""
+    deleted = _delete_old_rows(prune_seen_cache(horizon_hours))
+    if DEBUG and deleted > 0:
+        logger.debug(f"清理了 {deleted} 条过期记录")
 
 
-def is_duplicate_or_mark_seen(key: str, horizon_hours: int = 36) -> bool:
+def is_duplicate_or_mark_seen(key: bytes, horizon_hours: int = 36, dedup_text: str | None = None) -> bool:
     """
     滑动窗口去重：若 key 在最近 horizon_hours 小时内见过则返回 True（重复），
     否则插入/更新时间戳并返回 False（首次/过期）
+    判断只查内存，数据库写入交给后台 seen_flusher 批量完成
+    传入 dedup_text 时，还会按旧版本的 key 比对升级前写入的记录
     """
+    global _seen_flusher
     now = time.time()
     cutoff = now - max(1, horizon_hours) * 3600
+    last_seen = _seen_ts.get(key, 0.0)
+    if last_seen < cutoff and _legacy_seen_ts and dedup_text is not None:
+        last_seen = _legacy_seen_ts.get(compute_legacy_dedup_hash(dedup_text), 0.0)
+    _seen_ts[key] = now
 
-    with DB_LOCK:
-        row = DB.execute("SELECT ts FROM seen WHERE id=?", (key,)).fetchone()
-        if row:
-            last_ts = row[0] or 0.0
-            DB.execute("UPDATE seen SET ts=? WHERE id=?", (now, key))
-            DB.commit()
-            return last_ts >= cutoff
-
-        DB.execute("INSERT INTO seen(id, ts) VALUES(?, ?)", (key, now))
-        DB.commit()
-        return False
-
-# ========== 并发控制 ==========
-WRITE_SEMAPHORE = asyncio.Semaphore(5)
+    _pending_seen.append((key, now))
+    if _seen_flusher is None or _seen_flusher.done():
+        _seen_flusher = asyncio.create_task(seen_flusher())
+    if len(_pending_seen) >= DB_FLUSH_BATCH:
+        _seen_flush_event.set()
 
+    return last_seen >= cutoff
 
 # ========== 系统通知 ==========
 def send_notification(title: str, message: str) -> None:
@@ -392,57 +560,143 @@ def send_notification(title: str, message: str) -> None:
 
 
 # ========== 文件写入 ==========
-async def append_to_file(path: Path, text: str) -> None:
-    """追加文本到文件，自动创建父目录"""
+# Markdown 产物写入：单个后台任务汇总所有待写文本，按文件分组后一次追加
+# 每批都重新打开文件：同步工具（obsidian-git、Syncthing、iCloud）可能以重命名方式替换文件，
+# 长期持有的句柄会写进已被替换掉的旧 inode，内容静默丢失
+WRITE_BATCH_WINDOW = 0.2  # 秒，收集同批次文本的等待时间
+
+
+def _open_append(path: Path) -> Any:
+    """在线程池中执行：创建父目录并以追加模式打开文件"""
     path.parent.mkdir(parents=True, exist_ok=True)
-    async with aiofiles.open(path, "a", encoding="utf-8") as f:
-        await f.write(text)
+    return open(path, "a", encoding="utf-8", buffering=1 << 16)
+
+
+class AsyncArtifactWriter:
+    """异步批量写入器：写入请求只入队，由后台 flusher 按文件合并落盘"""
+    def __init__(self):
+        self._queue: asyncio.Queue[tuple[Path, str]] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def write(self, path: Path, text: str) -> None:
+        """追加文本到文件（不等待落盘），按需启动后台 flusher"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flusher())
+        self._queue.put_nowait((path, text))
+
+    async def flush(self) -> None:
+        """等待所有已入队的文本写入磁盘"""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """写完剩余文本并停止后台 flusher"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _flusher(self) -> None:
+        """后台任务：收集一个窗口内的文本，按文件分组后在线程池中统一写入"""
+        while True:
+            batch = [await self._queue.get()]
+            # 稍等片刻，收集同一批次的后续文本
+            await asyncio.sleep(WRITE_BATCH_WINDOW)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            groups: dict[Path, list[str]] = {}
+            for path, text in batch:
+                groups.setdefault(path, []).append(text)
+            try:
+                await asyncio.to_thread(self._write_groups, groups)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_groups(self, groups: dict[Path, list[str]]) -> None:
+        """在线程池中执行：每个文件一次 open + write + close"""
+        for path, lines in groups.items():
+            try:
+                with _open_append(path) as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                logger.error(f"写入文件失败 [{path}]: {e}")
+
+
+ARTIFACT_WRITER = AsyncArtifactWriter()
+
+
+# 今日目标文件缓存：(日期, 笔记路径, 任务路径)，跨天时重建
+_PATH_CACHE: tuple[str, Path, Path] | None = None
+
+
+def daily_paths() -> tuple[Path, Path]:
+    """返回今日笔记和任务文件路径，同一天内复用缓存的 Path 对象"""
+    global _PATH_CACHE
+    date = today()
+    if _PATH_CACHE is None or _PATH_CACHE[0] != date:
+        _PATH_CACHE = (date, VAULT / NOTES_DIR / f"{date}.md", VAULT / TASKS_DIR / f"{date}.md")
+    return _PATH_CACHE[1], _PATH_CACHE[2]
 
 
 async def write_to_obsidian(content: str, kind: str, timestamp: int | None = None) -> None:
     """统一写入接口"""
-    async with WRITE_SEMAPHORE:
-        try:
-            if kind == KEYWORD_NOTE:
-                filepath = VAULT / NOTES_DIR / f"{today()}.md"
-                prefix = f"- [{hhmm(timestamp)}] "
-                logger.info(f"目标文件: {filepath}")
-                # 更新统计
-                daily_stats.add_note()
-                # 发送通知
-                send_notification("📝 笔记已记录", f"{content.strip()}")
-            else:
-                filepath = VAULT / TASKS_DIR / f"{today()}.md"
-                prefix = "- [ ] "
-                logger.info(f"目标文件: {filepath}")
-                # 更新统计
-                daily_stats.add_task()
-                # 发送通知
-                send_notification("✅ 任务已添加", f"{content.strip()}")
-
-            await append_to_file(filepath, f"{prefix}{content.strip()}\n")
-            logger.info(f"写入{kind}: {content.strip()}")
-        except IOError as e:
-            logger.error(f"写入文件失败: {e}")
-            raise
+    content = content.strip()
+    notes_path, tasks_path = daily_paths()
+    if kind == KEYWORD_NOTE:
+        filepath = notes_path
+        prefix = f"- [{hhmm(timestamp)}] "
+        logger.info(f"目标文件: {filepath}")
+        # 更新统计
+        daily_stats.add_note()
+        # 发送通知
+        send_notification("📝 笔记已记录", content)
+    else:
+        filepath = tasks_path
+        prefix = "- [ ] "
+        logger.info(f"目标文件: {filepath}")
+        # 更新统计
+        daily_stats.add_task()
+        # 发送通知
+        send_notification("✅ 任务已添加", content)
+
+    ARTIFACT_WRITER.write(filepath, f"{prefix}{content}\n")
+    logger.info(f"写入{kind}: {content}")
 
 # ========== 文本提取 ==========
 JSON_TEXT_KEYS = ("text", "content", "message", "delta", "display_text")
+# JSON 解析失败时的兜底：直接从原文中抓取文本字段的字符串值
+JSON_TEXT_RE = re.compile(rf'"(?:{"|".join(JSON_TEXT_KEYS)})"\s*:\s*"(.*?)"')
+JSON_UNESCAPE_RE = re.compile(r'\\(["\\/bfnrt])')
+
+
+def unescape_json_string(value: str) -> str:
+    """还原 JSON 字符串转义：交给 orjson 按 JSON 规则解码（含 \\n、\\uXXXX），片段不完整时退回正则"""
+    if "\\" not in value:
+        return value
+    try:
+        return orjson.loads(f'"{value}"')
+    except orjson.JSONDecodeError:
+        return JSON_UNESCAPE_RE.sub(r"\1", value)
 
 
 def extract_texts_from_json(obj: Any) -> list[tuple[str, int | None]]:
-    """从 JSON 对象中递归提取包含关键词的文本，返回 (文本, 时间戳) 元组列表"""
+    """从 JSON 对象中提取包含关键词的文本，返回 (文本, 时间戳) 元组列表"""
     results = []
-
-    def pick(item: Any, timestamp: int | None = None, is_user_message: bool = True) -> None:
-        if isinstance(item, str):
+    # 显式栈代替递归，元素为 (节点, 时间戳, 是否用户消息)；逆序入栈以保持原有遍历顺序
+    stack: list[tuple[Any, int | None, bool]] = [(obj, None, True)]
+
+    while stack and len(results) < 50:
+        item, timestamp, is_user_message = stack.pop()
+        # orjson 只产出精确的 str/list/dict，type() 比较比 isinstance 链更快
+        item_type = type(item)
+        if item_type is str:
             # 只有在是用户消息时才提取文本
-            if is_user_message and (KEYWORD_NOTE in item or KEYWORD_TASK in item):
+            if is_user_message and KEYWORD_RE.search(item):
                 results.append((item, timestamp))
-        elif isinstance(item, list):
-            for element in item:
-                pick(element, timestamp, is_user_message)
-        elif isinstance(item, dict):
+        elif item_type is list:
+            stack.extend((element, timestamp, is_user_message) for element in reversed(item))
+        elif item_type is dict:
             # 检查是否是豆包的消息（过滤掉豆包的回复）
             current_is_user_message = is_user_message
             if "user_type" in item:
@@ -465,14 +719,18 @@ def extract_texts_from_json(obj: Any) -> list[tuple[str, int | None]]:
             if current_timestamp is None:
                 current_timestamp = timestamp
 
-            for key in JSON_TEXT_KEYS:
-                if key in item:
-                    pick(item[key], current_timestamp, current_is_user_message)
-            for value in item.values():
-                pick(value, current_timestamp, current_is_user_message)
+            # 每个值只访问一次；文本字段优先，使 50 条上限优先保留文本字段的命中
+            values = [item[key] for key in JSON_TEXT_KEYS if key in item]
+            if values:
+                values.extend(v for k, v in item.items() if k not in JSON_TEXT_KEYS)
+            else:
+                values = item.values()
+            stack.extend(
+                (value, current_timestamp, current_is_user_message)
+                for value in reversed(values)
+            )
 
-    pick(obj)
-    return results[:50]
+    return results
 
 
 def extract_texts(raw: str) -> list[tuple[str, int | None]]:
@@ -481,64 +739,76 @@ def extract_texts(raw: str) -> list[tuple[str, int | None]]:
     if not text:
         return []
 
+    # JSON 解析只会保留含关键词的字符串：原文既无关键词也无 \u 转义时解析不可能有结果，直接跳过
+    may_have_keyword = "\\u" in text or KEYWORD_RE.search(text) is not None
+
     try:
-        if (text.startswith("{") and text.endswith("}")) or (text.startswith("[") and text.endswith("]")):
+        if may_have_keyword and (
+            (text.startswith("{") and text.endswith("}")) or (text.startswith("[") and text.endswith("]"))
+        ):
             try:
-                obj = json.loads(text)
+                obj = orjson.loads(text)
                 results = extract_texts_from_json(obj)
                 if results:
                     return results
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 pass
 
-        matches = re.findall(r'"(?:text|content|message|delta|display_text)"\s*:\s*"(.*?)"', text)
+        # 流式 NDJSON：整体解析失败时逐行解析，避免直接退回到正则全文扫描
+        if may_have_keyword and "\n" in text:
+            results = []
+            for line in text.split("\n"):
+                line = line.strip()
+                if not line.startswith(("{", "[")):
+                    continue
+                try:
+                    results.extend(extract_texts_from_json(orjson.loads(line)))
+                except orjson.JSONDecodeError:
+                    continue
+                if len(results) >= 50:
+                    break
+            if results:
+                return results[:50]
+
+        matches = JSON_TEXT_RE.findall(text)
         if matches:
-            return [(re.sub(r'\\(["\\/bfnrt])', r'\1', m), None) for m in matches]
+            return [(unescape_json_string(m), None) for m in matches]
     except Exception as e:
         logger.warning(f"提取文本时出错: {e}")
 
     return [(text, None)]
 
 
-def is_keyword_only_message(text: str) -> str | None:
-    """检测是否为只包含关键词的消息，返回关键词类型或None"""
-    normalized = normalize_text(text)
+def is_keyword_only_message(normalized: str) -> str | None:
+    """检测是否为只包含关键词的消息，返回关键词类型或None（参数需已经过 normalize_text）"""
     if not normalized:
         return None
 
-    # 使用与CMD_RE相同的关键词变体，但只匹配关键词部分（没有内容）
-    # 构建所有可能的关键词变体
-    note_variants = [
-        KEYWORD_NOTE, "笔记", "几笔记", "及笔记", "即笔记", "寄笔记",
-        "记个笔记", "记一下笔记", "记录笔记", "记1个笔记", "记一个笔记",
-        "帮我记笔记", "帮我记个笔记", "帮我记一下笔记",
-        "记记笔记", "笔笔记", "记比记"
-    ]
-    task_variants = [
-        KEYWORD_TASK, "任务", "几任务", "及任务", "即任务", "寄任务",
-        "记个任务", "记一下任务", "记录任务", "记1个任务", "记一个任务",
-        "添加任务", "新增任务", "创建任务",
-        "帮我记任务", "帮我记个任务", "帮我添加任务", "帮我记一下任务",
-        "记记任务", "任任务", "人务", "认务", "仁务"
-    ]
-
-    all_variants = note_variants + task_variants
-    variants_pattern = "|".join(re.escape(v) for v in all_variants)
-
-    # 包含语气词和填充词的匹配
-    filler_words = r"(?:嗯[，,\s]*|那个[，,\s]*|OK[，,\s]*|好的[，,\s]*|呃[，,\s]*)?"
-
-    # 检查是否只包含关键词（可能带豆包豆包前缀和语气词）
-    keyword_only_pattern = rf"^\s*{filler_words}(?:豆包豆包[，,:：。\s]*)?{filler_words}(?:帮我\s*)?({variants_pattern})(?:[，,:：。\s吧呢啊]*)?$"
-    match = re.match(keyword_only_pattern, normalized, re.IGNORECASE)
+    match = KEYWORD_ONLY_RE.match(normalized)
     if match:
         return normalize_matched_keyword(match.group(1))
     return None
 
 
-def is_content_message(text: str) -> bool:
-    """检测是否为纯内容消息（不包含关键词）"""
-    normalized = normalize_text(text)
+def may_contain_command(line: str) -> bool:
+    """廉价预筛：不含任何关键词变体的行不可能命中命令正则"""
+    if CMD_NEEDLES_CASED:
+        line = line.lower()
+    for needle in CMD_NEEDLES:
+        if needle in line:
+            return True
+    return False
+
+
+def may_start_command(line: str) -> bool:
+    """廉价预筛：CMD_RE / KEYWORD_ONLY_RE 都锚定行首，开头不是合法前缀的行不可能命中（参数需已去除首尾空白）"""
+    if CMD_NEEDLES_CASED:
+        line = line.lower()
+    return line.startswith(CMD_PREFIXES)
+
+
+def is_content_message(normalized: str) -> bool:
+    """检测是否为纯内容消息（不包含关键词，参数需已经过 normalize_text）"""
     if not normalized:
         return False
 
@@ -556,14 +826,19 @@ async def handle_text(source: str, raw_text: str) -> None:
     import time
 
     try:
+        if not raw_text or is_raw_text_seen(raw_text):
+            return
+
         candidates = extract_texts(raw_text)
-        prefix_pattern = rf"^(?:豆包豆包[，,:：。\s]*)?(?:{re.escape(KEYWORD_NOTE)}|{re.escape(KEYWORD_TASK)})[：:，,。\s]+"
 
         for raw, msg_timestamp in candidates:
-            normalized = normalize_text(raw)
+            normalized = normalize_block(raw)
             if not normalized:
                 continue
 
+            # 整块文本先做一次预筛：不含任何关键词变体时，其中每一行都无需再检查
+            block_has_command = may_contain_command(normalized)
+
             for line in normalized.splitlines():
                 line = line.strip()
                 if not line:
@@ -585,8 +860,12 @@ async def handle_text(source: str, raw_text: str) -> None:
                         logger.debug(f"[{source}] 等待中的命令已过期，清除: {pending_command.command_type}")
                     pending_command = None
 
+                has_command = block_has_command and may_start_command(line)
+                # 行级归一化只做一次，供下面两种判断共用
+                line_normalized = normalize_text(line) if has_command or pending_command else ""
+
                 # 情况1: 检查是否为只包含关键词的消息
-                keyword_type = is_keyword_only_message(line)
+                keyword_type = is_keyword_only_message(line_normalized) if has_command else None
                 if keyword_type:
                     pending_command = PendingCommand(keyword_type, time.time())
                     if should_log_debug(f"{source}_keyword", 10):
@@ -594,7 +873,7 @@ async def handle_text(source: str, raw_text: str) -> None:
                     continue
 
                 # 情况2: 检查是否有等待中的命令，且当前消息为纯内容
-                if pending_command and is_content_message(line):
+                if pending_command and is_content_message(line_normalized):
                     kind = pending_command.command_type
                     content = line.strip()
 
@@ -605,8 +884,9 @@ async def handle_text(source: str, raw_text: str) -> None:
                         logger.debug(f"[{source}] 关联上下文: {kind} -> {content}")
 
                     # 去重检查
-                    dedup_key = compute_dedup_hash(kind + "|" + content)
-                    if is_duplicate_or_mark_seen(dedup_key, horizon_hours=DEDUP_HOURS):
+                    dedup_text = kind + "|" + content
+                    dedup_key = compute_dedup_hash(dedup_text)
+                    if is_duplicate_or_mark_seen(dedup_key, horizon_hours=DEDUP_HOURS, dedup_text=dedup_text):
                         if should_log_debug(f"{source}_duplicate_db", 60):
                             logger.debug(f"[{source}] 数据库重复内容，跳过: {content}")
                         continue
@@ -617,16 +897,19 @@ async def handle_text(source: str, raw_text: str) -> None:
                     continue
 
                 # 情况3: 传统的单条消息包含关键词和内容
+                if not has_command:
+                    continue
                 match = CMD_RE.match(line)
                 if not match:
                     continue
 
                 kind, content = normalize_matched_keyword(match.group(1)), match.group(2).strip()
-                content = re.sub(prefix_pattern, "", content).strip()
+                content = PREFIX_RE.sub("", content, count=1).strip()
 
                 # 去重检查
-                dedup_key = compute_dedup_hash(kind + "|" + content)
-                if is_duplicate_or_mark_seen(dedup_key, horizon_hours=DEDUP_HOURS):
+                dedup_text = kind + "|" + content
+                dedup_key = compute_dedup_hash(dedup_text)
+                if is_duplicate_or_mark_seen(dedup_key, horizon_hours=DEDUP_HOURS, dedup_text=dedup_text):
                     if should_log_debug(f"{source}_duplicate_db", 60):
                         logger.debug(f"[{source}] 数据库重复内容，跳过: {content}")
                     continue
@@ -639,44 +922,46 @@ async def handle_text(source: str, raw_text: str) -> None:
         logger.error(f"处理文本时出错 [{source}]: {e}")
 
 # ========== 页面抓取通道 ==========
-async def poll_dom(page: Page) -> None:
-    """DOM 轮询：扫描最近消息，增强检测能力"""
+# 多种选择器策略，提高捕获率
+# 聊天消息容器（DOM 轮询与注入脚本的重扫共用）
+MESSAGE_CONTAINER_SELECTORS = (
+    "[class*='message']",
+    "[class*='chat']",
+    "[class*='content']",
+)
+DOM_POLL_SELECTORS = (
+    # 原有选择器
+    ":is(div,li,article,section,p,span)",
+    # 更广泛的选择器
+    *MESSAGE_CONTAINER_SELECTORS,
+)
+# 一次 CDP 调用完成全部选择器：每个选择器取最后 20 个含关键词的元素，按出现顺序去重后返回
+# 页面已加载完成且注入脚本自上次轮询以来没有发现关键词时直接返回空列表
+POLL_DOM_JS = """([selectors, kwNote, kwTask, force]) => {
+  const dirty = window.__consumeDirty ? window.__consumeDirty() : 1;
+  if (!force && document.readyState === 'complete' && dirty === 0) return [];
+  const out = new Set();
+  for (const selector of selectors) {
+    const els = document.querySelectorAll(selector);
+    const picked = [];
+    for (let i = els.length - 1; i >= 0 && picked.length < 20; i--) {
+      const raw = els[i].textContent || '';
+      if (raw.includes(kwNote) || raw.includes(kwTask)) picked.push(els[i].innerText || '');
+    }
+    picked.reverse().forEach((t) => t && out.add(t));
+  }
+  return [...out];
+}"""
+
+
+async def poll_dom(page: Page, force: bool = False) -> None:
+    """DOM 轮询：扫描最近消息，增强检测能力；force 为 True 时忽略页面脏计数，完整扫描一次"""
     try:
-        # 多种选择器策略，提高捕获率
-        selectors = [
-            # 原有选择器
-            f":is(div,li,article,section,p,span):has-text('{KEYWORD_NOTE}')",
-            f":is(div,li,article,section,p,span):has-text('{KEYWORD_TASK}')",
-            # 新增更广泛的选择器
-            f"[class*='message']:has-text('{KEYWORD_NOTE}')",
-            f"[class*='message']:has-text('{KEYWORD_TASK}')",
-            f"[class*='chat']:has-text('{KEYWORD_NOTE}')",
-            f"[class*='chat']:has-text('{KEYWORD_TASK}')",
-            f"[class*='content']:has-text('{KEYWORD_NOTE}')",
-            f"[class*='content']:has-text('{KEYWORD_TASK}')",
-        ]
-
-        all_texts = set()  # 用于去重
-
-        for selector in selectors:
-            try:
-                nodes = page.locator(selector)
-                count = await nodes.count()
-                # 增加扫描范围：从最近10条增加到20条
-                start = max(0, count - 20)
-
-                for i in range(start, count):
-                    try:
-                        raw = await nodes.nth(i).inner_text()
-                        if raw and raw not in all_texts:
-                            all_texts.add(raw)
-                            await handle_text("DOM", raw)
-                    except Exception as e:
-                        if should_log_debug("dom_extract_error", 60):
-                            logger.debug(f"DOM 元素提取异常: {e}")
-            except Exception as e:
-                if should_log_debug("dom_selector_error", 60):
-                    logger.debug(f"DOM 选择器异常 [{selector}]: {e}")
+        texts = await page.evaluate(
+            POLL_DOM_JS, [list(DOM_POLL_SELECTORS), KEYWORD_NOTE, KEYWORD_TASK, force]
+        )
+        for raw in texts:
+            await handle_text("DOM", raw)
 
     except Exception as e:
         logger.error(f"DOM 轮询异常: {e}")
@@ -684,46 +969,81 @@ async def poll_dom(page: Page) -> None:
 
 def build_mutation_observer_js() -> str:
     """构建真正实时的 MutationObserver JavaScript 代码"""
-    kw_note = KEYWORD_NOTE.replace('\\', '\\\\').replace('/', '\\/')
-    kw_task = KEYWORD_TASK.replace('\\', '\\\\').replace('/', '\\/')
+    kw_note = json.dumps(KEYWORD_NOTE, ensure_ascii=False)
+    kw_task = json.dumps(KEYWORD_TASK, ensure_ascii=False)
+    message_selector = json.dumps(", ".join(MESSAGE_CONTAINER_SELECTORS))
     return f"""
 (() => {{
   console.log('🚀 豆包实时监控已启动');
 
+  const KW_NOTE = {kw_note};
+  const KW_TASK = {kw_task};
+  const MESSAGE_SELECTOR = {message_selector};
   const send = window.__emitMessage || (()=>{{}});
   const processed = new Set();
-  let messageQueue = [];
-  let isProcessing = false;
-
-  // 实时处理消息队列
-  const processQueue = async () => {{
-    if (isProcessing || messageQueue.length === 0) return;
-    isProcessing = true;
-
-    while (messageQueue.length > 0) {{
-      const text = messageQueue.shift();
-      const hash = btoa(unescape(encodeURIComponent(text))).slice(0,20);
-
-      if (!processed.has(hash)) {{
-        processed.add(hash);
-        console.log('📝 发现关键词消息:', text.slice(0, 100));
-        send(text);
-      }}
+
+  // 活动计数：发现关键词文本时递增，DOM 轮询读取并清零，无新活动时跳过扫描
+  window.__scanDirty = 0;
+  window.__consumeDirty = () => {{
+    const dirty = window.__scanDirty;
+    window.__scanDirty = 0;
+    return dirty;
+  }};
+
+  // 32 位 FNV-1a 哈希：整数键，无中间字符串分配
+  const fnv1a = (text) => {{
+    let h = 2166136261;
+    for (let i = 0; i < text.length; i++) {{
+      h ^= text.charCodeAt(i);
+      h = Math.imul(h, 16777619);
     }}
+    return h >>> 0;
+  }};
 
-    isProcessing = false;
+  // 新消息去重后进入发件箱，每 200ms 批量回传一次，减少跨进程调用
+  let outbox = [];
+  let flushTimer = null;
+  const flushOutbox = () => {{
+    flushTimer = null;
+    const batch = outbox;
+    outbox = [];
+    if (batch.length) send(batch);
+  }};
+  const enqueue = (text) => {{
+    const hash = fnv1a(text);
+    if (processed.has(hash)) return;
+    processed.add(hash);
+    console.log('📝 发现关键词消息:', text.slice(0, 100));
+    outbox.push(text);
+    if (flushTimer === null) flushTimer = setTimeout(flushOutbox, 200);
   }};
 
+  // 返回元素文本是否包含关键词：不包含时其子孙节点也不可能包含，调用方可跳过子树
   const scanElement = (element) => {{
-    if (!element || element.nodeType !== 1) return;
+    if (!element || element.nodeType !== 1) return false;
 
-    const text = (element.innerText || element.textContent || '').trim();
-    if (text && text.length > 0 && text.length < 4000) {{
-      if (/{kw_note}|{kw_task}/.test(text)) {{
-        messageQueue.push(text);
-        processQueue();
-      }}
+    // 先用 textContent（不触发布局）判断关键词，命中后才读取保留换行结构的 innerText
+    const raw = element.textContent || '';
+    if (!raw.includes(KW_NOTE) && !raw.includes(KW_TASK)) return false;
+
+    const text = (element.innerText || raw).trim();
+    if (text && text.length < 4000) {{
+      window.__scanDirty++;
+      enqueue(text);
     }}
+    return true;
+  }};
+
+  // 整页重扫：只扫描消息容器，空闲时执行，短时间内的多次请求合并为一次
+  let rescanScheduled = false;
+  const idle = window.requestIdleCallback || ((cb) => setTimeout(cb, 1));
+  const scheduleRescan = () => {{
+    if (rescanScheduled) return;
+    rescanScheduled = true;
+    idle(() => {{
+      rescanScheduled = false;
+      document.querySelectorAll(MESSAGE_SELECTOR).forEach(scanElement);
+    }}, {{ timeout: 500 }});
   }};
 
   // 高频实时监控
@@ -732,12 +1052,9 @@ def build_mutation_observer_js() -> str:
       // 监控新增节点
       if (mutation.addedNodes) {{
         mutation.addedNodes.forEach((node) => {{
-          if (node.nodeType === 1) {{
-            scanElement(node);
-            // 递归扫描所有子节点
-            if (node.querySelectorAll) {{
-              node.querySelectorAll('*').forEach(scanElement);
-            }}
+          // 新增子树含关键词时，再扫描其中的消息容器
+          if (node.nodeType === 1 && scanElement(node) && node.querySelectorAll) {{
+            node.querySelectorAll(MESSAGE_SELECTOR).forEach(scanElement);
           }}
         }});
       }}
@@ -765,7 +1082,7 @@ def build_mutation_observer_js() -> str:
   }});
 
   // 初始全页面扫描
-  document.querySelectorAll('*').forEach(scanElement);
+  scheduleRescan();
 
   // 定期清理缓存
   setInterval(() => {{
@@ -780,9 +1097,7 @@ def build_mutation_observer_js() -> str:
   // 监控页面焦点变化，确保不遗漏
   document.addEventListener('visibilitychange', () => {{
     if (!document.hidden) {{
-      setTimeout(() => {{
-        document.querySelectorAll('*').forEach(scanElement);
-      }}, 1000);
+      setTimeout(scheduleRescan, 1000);
     }}
   }});
 
@@ -799,6 +1114,8 @@ def build_mutation_observer_js() -> str:
     }}, 500);
   }}, {{ passive: true }});
 
+  // 活跃状态标记：lightweight_check 据此判断是否需要重新注入
+  window.__observerActive = true;
   console.log('✅ 豆包实时监控配置完成');
 }})();
 """
@@ -807,19 +1124,51 @@ def build_mutation_observer_js() -> str:
 MUTATION_JS = build_mutation_observer_js()
 
 
+# 每个 frame（按 URL）上次扫描内容的摘要，内容未变化时跳过处理
+_frame_last_hash: dict[str, bytes] = {}
+# 在页面内按行过滤：只回传含关键词的行及其后紧邻的一行（"只说关键词"时内容在下一行），
+# 避免每次把整页 50KB 文本经 CDP 传回 Python
+BRUTE_SCRAPE_JS = """([kwNote, kwTask]) => {
+  if (!document.body) return '';
+  const hasKeyword = (line) => line.includes(kwNote) || line.includes(kwTask);
+  const lines = document.body.innerText.slice(0, 50000).split('\\n');
+  const out = [];
+  for (let i = 0; i < lines.length; i++) {
+    if (!hasKeyword(lines[i])) continue;
+    out.push(lines[i]);
+    for (let j = i + 1; j < lines.length; j++) {
+      if (!lines[j].trim()) continue;
+      if (!hasKeyword(lines[j])) {
+        out.push(lines[j]);
+        i = j;
+      }
+      break;
+    }
+  }
+  return out.join('\\n');
+}"""
+
+
 async def brute_scrape(page: Page) -> None:
-    """暴力扫描：遍历所有 frame 的 innerText"""
+    """暴力扫描：并发读取所有 frame 中含关键词的文本行"""
     try:
-        for frame in page.frames:
-            try:
-                txt = await frame.evaluate(
-                    "document.body ? document.body.innerText.slice(0,50000) : ''"
-                )
-                if txt:
-                    await handle_text("Brute", txt)
-            except Exception as e:
+        frames = page.frames
+        results = await asyncio.gather(
+            *(frame.evaluate(BRUTE_SCRAPE_JS, [KEYWORD_NOTE, KEYWORD_TASK]) for frame in frames),
+            return_exceptions=True
+        )
+        for frame, txt in zip(frames, results):
+            if isinstance(txt, BaseException):
                 if DEBUG:
-                    logger.debug(f"Brute 子帧异常 [{getattr(frame, 'url', 'unknown')}]: {e}")
+                    logger.debug(f"Brute 子帧异常 [{getattr(frame, 'url', 'unknown')}]: {txt}")
+                continue
+            if not txt:
+                continue
+            digest = hashlib.blake2b(txt.encode(), digest_size=8).digest()
+            if _frame_last_hash.get(frame.url) == digest:
+                continue
+            _frame_last_hash[frame.url] = digest
+            await handle_text("Brute", txt)
     except Exception as e:
         logger.error(f"Brute 扫描异常: {e}")
 
@@ -890,23 +1239,31 @@ async def start_browser(
     raise RuntimeError(f"所有候选浏览器均失败：{last_error}")
 
 # ========== Observer 注入 ==========
+# 注入脚本回传过文本即置位，用于提前唤醒备用轮询循环并收紧轮询间隔
+_observer_activity = asyncio.Event()
+
+
+async def handle_observer_batch(texts: list[str]) -> None:
+    """处理注入脚本批量回传的文本（按发现顺序）"""
+    _observer_activity.set()
+    for text in texts:
+        await handle_text("Observer", text)
+
+
 async def inject_observer_to_page(page: Page) -> None:
     """向页面注入实时监控 MutationObserver"""
     try:
         await page.expose_function(
             "__emitMessage",
-            lambda s: asyncio.create_task(handle_text("Observer", s))
+            lambda batch: asyncio.create_task(handle_observer_batch(batch))
         )
     except Exception:
         pass  # 已暴露过则忽略
 
-    # 注入活跃状态标记
-    await page.evaluate("window.__observerActive = true;")
-
+    # 注入脚本自身会设置活跃状态标记，每个 frame 只需一次 evaluate
     for frame in page.frames:
         try:
             await frame.evaluate(MUTATION_JS)
-            await frame.evaluate("window.__observerActive = true;")
         except Exception as e:
             if should_log_debug("inject_frame_error", 60):
                 logger.debug(f"[Frame {getattr(frame, 'url', 'unknown')}] evaluate 失败: {e}")
@@ -934,31 +1291,48 @@ NETWORK_URL_KEYWORDS = (
     # 通用聊天关键词
     "send", "receive", "reply", "response", "content", "text"
 )
+# 所有 URL 关键词合并为一个正则，一次 C 级扫描代替逐个子串查找
+NETWORK_URL_RE = re.compile("|".join(map(re.escape, NETWORK_URL_KEYWORDS)))
+# 需要解析的响应 MIME 类型（去掉 "; charset=..." 等参数后比较）
+NETWORK_JSON_MIME_TYPES = frozenset({"application/json", "text/json"})
+
+
+# 可能携带登录 Set-Cookie 的请求类型；图片、脚本等静态资源不查询响应头
+LOGIN_SIGNAL_RESOURCE_TYPES = frozenset({"document", "xhr", "fetch"})
+
+AUTH_COOKIE_NAMES = frozenset({
+    'sessionid', 'sessionid_ss', 'passport_csrf_token',
+    'sid_guard', 'sid_tt', 'uid_tt', 'ssid_ucp_v1',
+    'ttwid', 'passport_auth_status'
+})
 
 
 def has_valid_login_cookies(cookies: list[dict]) -> bool:
     """
     检查是否包含有效的豆包登录 cookie
     豆包登录后会设置特定的认证 cookie，如 sessionid、passport_csrf_token 等
+    需要至少 5 个豆包 cookie 且命中至少 3 个认证 cookie，单次遍历、满足即返回
     """
-    if not cookies:
-        return False
+    doubao_count = 0
+    matched: set[str] = set()
+
+    for c in cookies or ():
+        if 'doubao.com' not in c.get('domain', ''):
+            continue
+        doubao_count += 1
+        name = c.get('name', '')
+        if name in AUTH_COOKIE_NAMES:
+            matched.add(name)
+        if doubao_count >= 5 and len(matched) >= 3:
+            return True
 
-    doubao_cookies = [c for c in cookies if 'doubao.com' in c.get('domain', '')]
-
-    if len(doubao_cookies) < 5:
-        return False
-
-    auth_cookie_names = {
-        'sessionid', 'sessionid_ss', 'passport_csrf_token',
-        'sid_guard', 'sid_tt', 'uid_tt', 'ssid_ucp_v1',
-        'ttwid', 'passport_auth_status'
-    }
+    return False
 
-    cookie_names = {c.get('name', '') for c in doubao_cookies}
-    matched = auth_cookie_names & cookie_names
 
-    return len(matched) >= 3
+def save_storage_state(state: dict) -> None:
+    """将登录状态快照写入 STATE_PATH（在线程池中执行）"""
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_bytes(orjson.dumps(state))
 
 
 async def wait_for_login(context: BrowserContext, browser: Browser) -> bool:
@@ -975,42 +1349,80 @@ async def wait_for_login(context: BrowserContext, browser: Browser) -> bool:
     stable_count = 0
     max_wait_seconds = 300
     check_interval = 2
+    idle_recheck_seconds = 30  # 没有 Set-Cookie 事件时的兜底检查间隔
 
-    for i in range(max_wait_seconds // check_interval):
-        await asyncio.sleep(check_interval)
+    # 事件驱动：豆包响应下发 Cookie 时立即唤醒检查，而不是每 2 秒读取一次整个 cookie 罐
+    login_signal = asyncio.Event()
 
+    async def on_response(resp: Any) -> None:
+        # resp.headers 不包含 set-cookie，需单独查询（每次一个协议往返），静态资源直接跳过
         try:
-            cookies = await context.cookies()
-
-            if has_valid_login_cookies(cookies):
-                stable_count += 1
-                if DEBUG:
-                    logger.debug(f"检测到有效登录 cookie，稳定计数: {stable_count}/3")
+            if (
+                "doubao.com" in resp.url
+                and resp.request.resource_type in LOGIN_SIGNAL_RESOURCE_TYPES
+                and await resp.header_value("set-cookie")
+            ):
+                login_signal.set()
+        except Exception:
+            pass
 
-                if stable_count >= 3:
-                    await context.storage_state(path=str(STATE_PATH))
+    context.on("response", on_response)
+    start = time.monotonic()
+    deadline = start + max_wait_seconds
+    next_progress_log = start + 30
 
-                    logger.info("========================================")
-                    logger.info("  登录成功！Cookie 已保存")
-                    logger.info("  浏览器将在 3 秒后关闭...")
-                    logger.info("========================================")
-                    await asyncio.sleep(3)
-                    await browser.close()
-                    logger.info("浏览器已关闭。请重新运行服务以后台模式启动。")
-                    return True
+    try:
+        while (remaining := deadline - time.monotonic()) > 0:
+            if stable_count:
+                # 已检测到有效 cookie：按固定间隔确认稳定性，登录后的 Set-Cookie 突发不能提前唤醒
+                await asyncio.sleep(min(check_interval * random.uniform(0.7, 1.3), remaining))
             else:
-                if stable_count > 0 and DEBUG:
-                    logger.debug("cookie 状态变化，重置稳定计数")
-                stable_count = 0
+                # 尚未登录：等待下一次 Set-Cookie，长时间无事件时兜底检查
+                timeout = idle_recheck_seconds * random.uniform(0.7, 1.3)
+                try:
+                    await asyncio.wait_for(login_signal.wait(), timeout=min(timeout, remaining))
+                except asyncio.TimeoutError:
+                    pass
+            login_signal.clear()
 
-        except Exception as e:
-            if DEBUG:
-                logger.debug(f"检查 cookie 时出错: {e}")
-            stable_count = 0
+            try:
+                cookies = await context.cookies()
+
+                if has_valid_login_cookies(cookies):
+                    stable_count += 1
+                    if DEBUG:
+                        logger.debug(f"检测到有效登录 cookie，稳定计数: {stable_count}/3")
+
+                    if stable_count >= 3:
+                        # 只从浏览器取回快照，序列化与落盘放到线程池
+                        state = await context.storage_state()
+                        await asyncio.to_thread(save_storage_state, state)
+
+                        logger.info("========================================")
+                        logger.info("  登录成功！Cookie 已保存")
+                        logger.info("  浏览器将在 3 秒后关闭...")
+                        logger.info("========================================")
+                        await asyncio.sleep(3)
+                        await browser.close()
+                        logger.info("浏览器已关闭。请重新运行服务以后台模式启动。")
+                        return True
+                else:
+                    if stable_count > 0 and DEBUG:
+                        logger.debug("cookie 状态变化，重置稳定计数")
+                    stable_count = 0
+
+            except Exception as e:
+                if DEBUG:
+                    logger.debug(f"检查 cookie 时出错: {e}")
+                stable_count = 0
 
-        elapsed = (i + 1) * check_interval
-        if elapsed % 30 == 0:
-            logger.info(f"等待登录中... 已等待 {elapsed} 秒（最长 {max_wait_seconds} 秒）")
+            # 按单调时钟打印进度，不依赖检查次数
+            now = time.monotonic()
+            if now >= next_progress_log:
+                logger.info(f"等待登录中... 已等待 {int(now - start)} 秒（最长 {max_wait_seconds} 秒）")
+                next_progress_log += 30
+    finally:
+        context.remove_listener("response", on_response)
 
     logger.error("登录超时（5分钟），请重试")
     return False
@@ -1019,29 +1431,35 @@ async def wait_for_login(context: BrowserContext, browser: Browser) -> bool:
 async def handle_network_response(resp: Any) -> None:
     """处理网络响应，提取 JSON 中的文本"""
     try:
-        content_type = (resp.headers.get("content-type") or "").lower()
-        if "application/json" not in content_type:
+        # URL 过滤只是一次正则扫描，先于读取响应头进行
+        url = resp.url
+        if not NETWORK_URL_RE.search(url):
             return
 
-        url = resp.url
-        if not any(keyword in url for keyword in NETWORK_URL_KEYWORDS):
+        content_type = resp.headers.get("content-type") or ""
+        mime_type = content_type.partition(";")[0].strip().lower()
+        if mime_type not in NETWORK_JSON_MIME_TYPES:
             return
 
         try:
-            data = await resp.json()
+            # 直接解析原始字节，避免 resp.json() 的解码和标准库 json 开销
+            data = orjson.loads(await resp.body())
         except Exception:
             return
 
-        # 临时调试：查看包含关键词的消息的完整数据结构
+        # texts 中只有含关键词的文本，为空即无需处理
         texts = extract_texts_from_json(data)
-        if texts and any(KEYWORD_NOTE in text or KEYWORD_TASK in text for text, _ in texts):
-            if DEBUG:
-                logger.debug(f"[Network] 包含关键词的消息数据结构: {json.dumps(data, ensure_ascii=False, indent=2)[:1000]}...")
+        if not texts:
+            return
 
-        for text, timestamp in texts:
+        for text, _ in texts:
             await handle_text("Network", text)
 
-        if DEBUG and texts:
+        # 临时调试：查看包含关键词的消息的数据结构
+        # 序列化整个响应代价较高，只在 DEBUG 日志确实输出时进行
+        if DEBUG and logger.isEnabledFor(logging.DEBUG):
+            snippet = orjson.dumps(data).decode()[:1000]
+            logger.debug(f"[Network] 包含关键词的消息数据结构: {snippet}...")
             logger.debug(f"[Network] 命中 {len(texts)} 条, URL: {url}")
     except Exception as e:
         logger.debug(f"处理网络响应异常: {e}")
@@ -1051,67 +1469,76 @@ async def run_polling_loop(page: Page) -> None:
     """运行轻量级轮询循环，主要依赖实时监控"""
     logger.info(f"开始实时监听...（备用轮询间隔 {POLL_INTERVAL}s）")
 
-    last_activity_time = time.time()
     consecutive_empty_polls = 0
+    last_total = daily_stats.total
+
+    # 智能轮询：有新记录时按倍数缩短间隔，空轮询时按倍数放宽，限定在 [FAST, SLOW] 区间内
+    min_interval = settings.FAST_POLL_INTERVAL
+    max_interval = max(settings.SLOW_POLL_INTERVAL, min_interval)
+    poll_interval = float(POLL_INTERVAL)
 
     while True:
         try:
+            # 网络监听保持活跃
+            # brute_scrape 改为轻量级检查
+            checks = [lightweight_check(page)]
+
             # 轻量级备用扫描，主要依赖 MutationObserver
-            # 只在必要时进行 DOM 扫描
-            if consecutive_empty_polls > 20:  # 长时间无活动时才进行备用扫描
-                await poll_dom(page)
+            # 长时间无活动时强制完整扫描，不受页面脏计数限制：用于发现实时监控漏掉的消息
+            if consecutive_empty_polls > 20:
+                checks.append(poll_dom(page, force=True))
                 consecutive_empty_polls = 0
+            # 实时监控报告页面有变化：补扫一次同批变化的节点（受页面脏计数限制）
+            elif _observer_activity.is_set():
+                checks.append(poll_dom(page))
+            _observer_activity.clear()
 
-            # 网络监听保持活跃
-            # brute_scrape 改为轻量级检查
-            await lightweight_check(page)
+            # 两者互不依赖（各自处理异常），并发执行，本轮耗时取较慢者而非两者之和
+            await asyncio.gather(*checks)
 
             # 检查是否有新活动
-            current_stats_total = daily_stats.notes_count + daily_stats.tasks_count
-            if hasattr(run_polling_loop, '_last_total'):
-                if current_stats_total > run_polling_loop._last_total:
-                    last_activity_time = time.time()
-                    consecutive_empty_polls = 0
-                    logger.info(f"✅ 检测到新记录！总计: {current_stats_total}")
-                else:
-                    consecutive_empty_polls += 1
+            current_stats_total = daily_stats.total
+            has_activity = current_stats_total > last_total
+            last_total = current_stats_total
+            if has_activity:
+                consecutive_empty_polls = 0
+                logger.info(f"✅ 检测到新记录！总计: {current_stats_total}")
             else:
-                run_polling_loop._last_total = current_stats_total
-
-            run_polling_loop._last_total = current_stats_total
+                consecutive_empty_polls += 1
 
-            # 智能轮询间隔：主要依赖实时监控，轮询间隔可以更长
             if settings.SMART_POLLING:
-                time_since_activity = time.time() - last_activity_time
-                if time_since_activity < 300:  # 5分钟内有活动
-                    poll_interval = settings.FAST_POLL_INTERVAL * 2  # 实时监控下可以放宽
-                elif consecutive_empty_polls > 10:
-                    poll_interval = settings.SLOW_POLL_INTERVAL
+                if has_activity:
+                    poll_interval = max(min_interval, poll_interval / 1.5)
                 else:
-                    poll_interval = POLL_INTERVAL
-            else:
-                poll_interval = POLL_INTERVAL
+                    poll_interval = min(max_interval, poll_interval * 1.25)
 
             if should_log_debug("polling_info", 300):  # 降低日志频率
-                logger.debug(f"轮询间隔: {poll_interval}s, 空轮询次数: {consecutive_empty_polls}, 实时监控活跃")
+                logger.debug(f"轮询间隔: {poll_interval:.1f}s, 空轮询次数: {consecutive_empty_polls}, 实时监控活跃")
 
         except Exception as e:
-            if "has been closed" in str(e):
+            # 页面关闭由 Playwright 抛出，直接读取 message 字段，不格式化整个异常
+            if isinstance(e, PlaywrightError) and "has been closed" in e.message:
                 logger.info("检测到页面关闭，退出。")
                 break
             if should_log_debug("polling_error", 30):
                 logger.debug(f"轮询异常: {e}")
 
-        await asyncio.sleep(poll_interval)
+        # 随机抖动，避免与页面及其他定时任务同步触发；实时监控回传文本时提前结束等待
+        try:
+            await asyncio.wait_for(
+                _observer_activity.wait(), timeout=poll_interval * random.uniform(0.7, 1.3)
+            )
+        except asyncio.TimeoutError:
+            continue
+
+        # 页面有变化：至少间隔 min_interval 再进入下一轮，突发的多批回传合并为一次 DOM 扫描
+        await asyncio.sleep(min_interval)
 
 
 async def lightweight_check(page: Page) -> None:
     """轻量级检查，确保页面活跃"""
     try:
-        # 简单的页面活跃性检查
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-
-        # 确保 MutationObserver 仍在运行
+        # 确保 MutationObserver 仍在运行（该调用本身即可确认页面仍然可用，无需再滚动页面）
         is_observer_active = await page.evaluate("""
             () => {
                 return window.__observerActive || false;
@@ -1128,8 +1555,11 @@ async def lightweight_check(page: Page) -> None:
 
 
 # ========== 菜单栏图标 ==========
-def create_icon_image() -> Image.Image:
-    """创建菜单栏图标"""
+@lru_cache(maxsize=1)
+def create_icon_image() -> "Image.Image":
+    """创建菜单栏图标（图标固定不变，只绘制一次；调用方不应修改返回的图像）"""
+    from PIL import Image, ImageDraw
+
     # 创建一个简单的图标
     width = height = 64
     image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
@@ -1147,6 +1577,8 @@ def create_icon_image() -> Image.Image:
 
 def create_menu():
     """创建菜单栏图标的右键菜单"""
+    import pystray
+
     def show_stats():
         """显示统计信息"""
         stats = daily_stats.get_summary()
@@ -1180,7 +1612,7 @@ def start_system_tray():
         logger.info("可以通过右键菜单栏图标查看统计（功能暂时不可用）")
         return None
 
-        # 原始代码保留，待后续优化
+        # 原始代码保留，待后续优化（启用时需在此处 import pystray）
         # icon = pystray.Icon(
         #     "doubao_voice_notes",
         #     create_icon_image(),
@@ -1225,6 +1657,21 @@ def print_startup_banner() -> None:
     print()
 
 
+def find_obsidian_vaults(base_paths: list[Path]) -> list[Path]:
+    """在给定目录的直接子目录中查找 Obsidian 仓库（含 .obsidian 文件夹），在线程池中执行"""
+    vaults = []
+    for base_path in base_paths:
+        try:
+            # scandir 自带目录项类型，普通子目录无需逐个 stat
+            with os.scandir(base_path) as entries:
+                for entry in entries:
+                    if entry.is_dir() and os.path.isdir(os.path.join(entry.path, ".obsidian")):
+                        vaults.append(Path(entry.path))
+        except OSError:
+            continue  # 目录不存在或无权限
+    return vaults
+
+
 async def main() -> None:
     """主入口函数"""
     print_startup_banner()
@@ -1264,25 +1711,19 @@ async def main() -> None:
 
             # 更新 .env 文件
             env_file = Path(__file__).parent / ".env"
-            if not env_file.exists():
-                env_file.write_text("")
-
-            env_content = env_file.read_text(encoding='utf-8')
-
-            # 检查并更新 OBSIDIAN_VAULT
-            import re
-            if re.search(r'^OBSIDIAN_VAULT\s*=', env_content, re.MULTILINE):
-                env_content = re.sub(
-                    r'^OBSIDIAN_VAULT\s*=.*$',
-                    f'OBSIDIAN_VAULT={str(vault_path)}',
-                    env_content,
-                    count=1,
-                    flags=re.MULTILINE
-                )
-            else:
-                env_content += f'\nOBSIDIAN_VAULT={str(vault_path)}\n'
-
-            env_file.write_text(env_content, encoding='utf-8')
+            old_content = env_file.read_text(encoding='utf-8') if env_file.exists() else ""
+
+            # 检查并更新 OBSIDIAN_VAULT（函数替换，避免路径中的反斜杠被当作转义）
+            vault_line = f'OBSIDIAN_VAULT={str(vault_path)}'
+            env_content, replaced = _ENV_VAULT_RE.subn(lambda _: vault_line, old_content, count=1)
+            if not replaced:
+                env_content += f'\n{vault_line}\n'
+
+            if env_content != old_content:
+                # 先写临时文件再原子替换，中途失败不会留下被截断的 .env
+                tmp_file = env_file.with_name(".env.tmp")
+                tmp_file.write_text(env_content, encoding='utf-8')
+                os.replace(tmp_file, env_file)
             print("✅ .env 文件已更新")
             print("\n请重新启动程序：")
             print("  python main.py")
@@ -1301,18 +1742,11 @@ async def main() -> None:
                 home / "Library" / "Mobile Documents" / "iCloud~obsidian",
             ]
 
-            found = False
-            for base_path in common_paths:
-                if not base_path.exists():
-                    continue
+            vaults = await asyncio.to_thread(find_obsidian_vaults, common_paths)
+            for vault in vaults:
+                print(f"\n✅ 找到仓库: {vault}")
 
-                # 查找 .obsidian 文件夹（Obsidian 仓库的标识）
-                for vault in base_path.iterdir():
-                    if vault.is_dir() and (vault / ".obsidian").exists():
-                        print(f"\n✅ 找到仓库: {vault}")
-                        found = True
-
-            if not found:
+            if not vaults:
                 print("\n❌ 未找到 Obsidian 仓库")
                 print("请手动选择选项 1 并输入路径。")
             return
@@ -1354,6 +1788,7 @@ async def main() -> None:
 
             await run_polling_loop(page)
         finally:
+            await ARTIFACT_WRITER.close()
             if browser:
                 try:
                     await browser.close()
@@ -1362,7 +1797,10 @@ async def main() -> None:
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("程序被用户中断")
     except Exception as e: